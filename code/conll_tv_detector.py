@@ -1,9 +1,20 @@
-from typing import Tuple, List, Optional
+from functools import lru_cache
+from itertools import islice
+from multiprocessing import Pool
+from typing import Iterable, Iterator, Tuple, List, Optional
 
 import conllu
+import numpy as np
 from conllu import parse_incr as conll_parse_incr, parse as conll_parse
 
-from tv_detector import TVDetector
+from tv_detector import T_MASK, V_MASK, TVDetector
+
+# distinct (upos, lemma, Number, Person) combinations to memoize; lemma
+# distributions are Zipfian, so most tokens of a large corpus hit the cache
+TOKEN_CACHE_SIZE = 65536
+
+# sentences shipped to a worker process at once, amortizes IPC overhead
+CONLL_BATCH_SIZE = 128
 
 
 class ConllTVDetector(TVDetector):
@@ -11,10 +22,13 @@ class ConllTVDetector(TVDetector):
 
     def detect_t_v_labels(
             self, lines: Optional[List[str]] = None, filename: Optional[str] = None,
+            n_processes: Optional[int] = None,
     ) -> List[Tuple[bool, bool]]:
         """Detects T/V labels using grammar-based information.
 
         Accepts either list of strings in CoNLL format or path to source file with CoNLL data.
+        Sentences are independent, so detection optionally fans out to a pool
+        of worker processes with order of results preserved.
 
         Parameters
         ----------
@@ -22,6 +36,9 @@ class ConllTVDetector(TVDetector):
             Sentences parsed to CoNLL format.
         filename: str, optional
             Name of file, which holds sentences parsed to CoNLL format.
+        n_processes: int, optional
+            Number of worker processes to detect with. Detection runs
+            in the current process if not provided.
 
         Returns
         -------
@@ -41,97 +58,166 @@ class ConllTVDetector(TVDetector):
             raise RuntimeError('Error occured on T/V labels detection. '
                                'Either source file or list of sentences have to be provided.')
 
-        t_v_list = []
-
         if filename:
-            data_file = open(filename, "r", encoding="utf-8")
-            for tokenlist in conll_parse_incr(data_file):
-                t_v_list.append(self._detect_t_v_from_conll(tokenlist))
+            # the file handle is released right after the parsing stream is drained
+            with open(filename, "r", encoding="utf-8") as data_file:
+                t_v_list = self._collect_t_v_labels(conll_parse_incr(data_file), n_processes)
         else:
-            for line in lines:
-                for tokenlist in conll_parse(line):
-                    t_v_list.append(self._detect_t_v_from_conll(tokenlist))
+            tokenlists = (tokenlist for line in lines for tokenlist in conll_parse(line))
+            t_v_list = self._collect_t_v_labels(tokenlists, n_processes)
 
-        t_sentences_num = sum(t_item for t_item, v_item in t_v_list)
-        v_sentences_num = sum(v_item for t_item, v_item in t_v_list)
-        print(f'Neutral sentences: {len(t_v_list) - v_sentences_num - t_sentences_num}. '
-              f'V sentences found: {v_sentences_num}. '
-              f'T sentences found: {t_sentences_num}. ')
+        self._report_t_v_counts(t_v_list)
 
         return t_v_list
 
-    @classmethod
-    def _check_token_for_v(cls, parsed_token: conllu.models.Token) -> bool:
-        """Checks if passed token is V-specific or not.
-
-        We check V-form lemma of the specific Russian pronoun (polite you) and determiner (polite your).
-        Also, we look for verbs of plural number and second person.
+    def _collect_t_v_labels(
+            self, tokenlists: Iterable[conllu.models.TokenList], n_processes: Optional[int],
+    ) -> List[Tuple[bool, bool]]:
+        """Drains a stream of parsed sentences through the batch detection kernel.
 
         Parameters
         ----------
-        parsed_token: conllu.models.Token
-            CoNLL token with morphological information.
+        tokenlists: Iterable[conllu.models.TokenList]
+            Stream of sentences parsed to token lists in CoNLL format.
+        n_processes: int, optional
+            Number of worker processes to detect with. Detection runs
+            in the current process if not provided.
 
         Returns
         -------
-        bool
-            flag determining whether we found V-specific token or not.
+        List[Tuple[bool, bool]]
+            (t_label, v_label) tuple per sentence, order preserved.
         """
+        batches = self._batch_tokenlists(tokenlists)
+        if n_processes:
+            with Pool(n_processes) as pool:
+                batch_results = pool.imap(self._detect_t_v_batch, batches)
+                return [t_v_item for batch_result in batch_results for t_v_item in batch_result]
 
-        return (parsed_token['upos'] == 'PRON' and parsed_token['lemma'] == 'вы') or \
-               (parsed_token['upos'] == 'DET' and parsed_token['lemma'] == 'ваш') or \
-               (parsed_token['upos'] == 'VERB' and
-                parsed_token['feats'].get('Number') == 'Plur' and
-                parsed_token['feats'].get('Person') == '2')
+        return [t_v_item for batch in batches for t_v_item in self._detect_t_v_batch(batch)]
 
     @classmethod
-    def _check_token_for_t(cls, parsed_token: conllu.models.Token) -> bool:
-        """Checks if passed token is T-specific or not.
+    def _batch_tokenlists(
+            cls, tokenlists: Iterable[conllu.models.TokenList],
+    ) -> Iterator[List[List[conllu.models.Token]]]:
+        """Groups a stream of parsed sentences into fixed-size batches.
 
-        We check T-form lemma of the specific Russian pronoun (informal you) and determiner (informal your).
-        Also, we look for verbs of single number and second person.
+        Parsing keeps running in the main process while worker processes consume
+        already-built batches, so I/O plus conllu parsing overlap with detection
+        compute. conllu.models.TokenList does not survive a pickling round-trip,
+        so sentences are converted to plain lists of tokens along the way.
 
         Parameters
         ----------
-        parsed_token: conllu.models.Token
-            CoNLL token with morphological information.
+        tokenlists: Iterable[conllu.models.TokenList]
+            Stream of sentences parsed to token lists in CoNLL format.
 
-        Returns
-        -------
-        bool
-            flag determining whether we found T-specific token or not.
+        Yields
+        ------
+        List[List[conllu.models.Token]]
+            Batches of up to CONLL_BATCH_SIZE sentences.
         """
-        return (parsed_token['upos'] == 'PRON' and parsed_token['lemma'] == 'ты') \
-               or (parsed_token['upos'] == 'DET' and parsed_token['lemma'] == 'твой') \
-               or (parsed_token['upos'] == 'VERB'
-                   and parsed_token['feats'].get('Number') == 'Sing'
-                   and parsed_token['feats'].get('Person') == '2')
+        tokenlists = iter(tokenlists)
+        while True:
+            batch = [list(tokenlist) for tokenlist in islice(tokenlists, CONLL_BATCH_SIZE)]
+            if not batch:
+                return
+            yield batch
 
     @classmethod
-    def _detect_t_v_from_conll(cls, conll_token_list: conllu.models.TokenList) -> Tuple[bool, bool]:
-        """Performs grammar-based T/V detection.
-
-        Iterates by token list in CoNLLL format and looks for T-specific or V-specific tokens,
-        which we determine using set of grammar-based heuristics.
+    def _detect_t_v_batch(
+            cls, token_batch: List[List[conllu.models.Token]],
+    ) -> List[Tuple[bool, bool]]:
+        """Runs grammar-based T/V detection over a batch of sentences.
 
-        If both T/V-specific found, then sentences is marked as neutral.
+        Per-token classifications of the whole batch are collected into one flat
+        mask array with sentence boundary offsets alongside, and the per-sentence
+        masks fall out of a single vectorized np.bitwise_or.reduceat over the
+        contiguous buffer instead of per-sentence Python reduction loops.
 
         Parameters
         ----------
-        conll_token_list: conllu.models.TokenList
-            Source sentence parsed to token list in CoNLL format.
+        token_batch: List[List[conllu.models.Token]]
+            Batch of sentences, each one a plain list of CoNLL tokens.
 
         Returns
         -------
-        Tuple[bool, bool]
-            Tuple of the (bool, bool) format with meaning (t_label, v_label).
+        List[Tuple[bool, bool]]
+            (t_label, v_label) tuple per sentence of the batch, order preserved.
         """
-        v_token_met = t_token_met = False
-        for parsed_token in conll_token_list:
-            v_token_met |= cls._check_token_for_v(parsed_token)
-            t_token_met |= cls._check_token_for_t(parsed_token)
+        classify_token = cls._classify_token
+
+        token_masks = []
+        sentence_offsets = []
+        for tokenlist in token_batch:
+            sentence_offsets.append(len(token_masks))
+            if not tokenlist:
+                # keeps every reduceat segment non-empty
+                token_masks.append(0)
+                continue
+            for parsed_token in tokenlist:
+                feats = parsed_token['feats']
+                token_masks.append(classify_token(
+                    parsed_token['upos'], parsed_token['lemma'],
+                    feats.get('Number') if feats else None,
+                    feats.get('Person') if feats else None,
+                ))
+
+        mask_arr = np.fromiter(token_masks, dtype=np.uint8, count=len(token_masks))
+        sentence_masks = np.bitwise_or.reduceat(mask_arr, sentence_offsets)
+
+        return [(mask == T_MASK, mask == V_MASK) for mask in sentence_masks.tolist()]
+
+    @staticmethod
+    @lru_cache(maxsize=TOKEN_CACHE_SIZE)
+    def _classify_token(
+            upos: str, lemma: str, number: Optional[str], person: Optional[str],
+    ) -> int:
+        """Classifies a single token as T-specific, V-specific or neither.
+
+        The grammar-based heuristics look at lemmas of the specific Russian
+        pronouns (informal/polite you) and determiners (informal/polite your)
+        plus verbs of second person, where number (Sing/Plur) separates the
+        T-form from the V-form.
+
+        A cache miss dispatches on upos once instead of re-testing it in
+        every condition: each POS branch only inspects the fields relevant
+        to it, and the VERB branch rejects on Person first, which fails for
+        the vast majority of verbs. Results are memoized on the four-field
+        key: lemma frequencies are Zipfian, so on a large corpus most
+        tokens resolve to a single cache hit instead.
 
-        t_sentence_found = t_token_met and not v_token_met
-        v_sentence_found = v_token_met and not t_token_met
+        Parameters
+        ----------
+        upos: str
+            Universal POS tag of the token.
+        lemma: str
+            Lemma of the token.
+        number: str, optional
+            Number morphological feature of the token, if present.
+        person: str, optional
+            Person morphological feature of the token, if present.
 
-        return t_sentence_found, v_sentence_found
+        Returns
+        -------
+        int
+            Bitmask holding T_MASK and/or V_MASK for a T/V-specific token,
+            zero otherwise.
+        """
+        if upos == 'PRON':
+            if lemma == 'ты':
+                return T_MASK
+            if lemma == 'вы':
+                return V_MASK
+        elif upos == 'DET':
+            if lemma == 'твой':
+                return T_MASK
+            if lemma == 'ваш':
+                return V_MASK
+        elif upos == 'VERB' and person == '2':
+            if number == 'Sing':
+                return T_MASK
+            if number == 'Plur':
+                return V_MASK
+
+        return 0
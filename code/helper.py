@@ -1,5 +1,10 @@
+import hashlib
 import os
+import re
+from concurrent.futures import ThreadPoolExecutor
 from typing import Tuple, List
+
+import numpy as np
 from sacrebleu import corpus_bleu
 
 from tv_detector import SimpleTVDetector
@@ -7,6 +12,82 @@ from conll_tv_detector import ConllTVDetector
 
 DEIXIS_EOS_SEPARATOR = '_eos'
 
+# sentences inside deixis files are delimited either by the _eos marker or by line ends
+_DEIXIS_SENTENCE_SEPARATOR_PATTERN = re.compile(DEIXIS_EOS_SEPARATOR + r'|\n')
+
+
+class _BloomFilter:
+    """Constant-memory approximate set membership over strings.
+
+    Used to deduplicate sentences without retaining every unique string in
+    memory: probes cost O(1) and the footprint is a fixed bitmap, at the price
+    of a tiny false-positive chance (a unique sentence may rarely be treated
+    as seen). With the default 2^24 bits the chance stays negligible up to
+    hundreds of thousands of entries.
+    """
+
+    def __init__(self, size_bits: int = 1 << 24, num_probes: int = 4):
+        """Initialises empty filter.
+
+        Parameters
+        ----------
+        size_bits: int
+            Size of the underlying bitmap in bits.
+        num_probes: int
+            Number of bit positions probed per item.
+        """
+        self.size_bits = size_bits
+        self.num_probes = num_probes
+        self.bitmap = bytearray(size_bits // 8)
+
+    def _probe_positions(self, item: str) -> List[int]:
+        """Derives bit positions for an item from a single stable digest.
+
+        Parameters
+        ----------
+        item: str
+            Item to derive positions for.
+
+        Returns
+        -------
+        List[int]
+            Bit positions of the item in the bitmap.
+        """
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        hash_one = int.from_bytes(digest[:8], 'little')
+        hash_two = int.from_bytes(digest[8:], 'little')
+        return [(hash_one + i * hash_two) % self.size_bits for i in range(self.num_probes)]
+
+    def add(self, item: str) -> None:
+        """Marks item as seen.
+
+        Parameters
+        ----------
+        item: str
+            Item to add to the filter.
+        """
+        for position in self._probe_positions(item):
+            self.bitmap[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item: str) -> bool:
+        """Checks whether item was (probably) seen before.
+
+        Parameters
+        ----------
+        item: str
+            Item to check.
+
+        Returns
+        -------
+        bool
+            False if the item was definitely never added, True if it
+            (almost certainly) was.
+        """
+        return all(
+            self.bitmap[position >> 3] & (1 << (position & 7))
+            for position in self._probe_positions(item)
+        )
+
 
 def compare_tv_detectors(source_filepath: str):
     """Reports accuracy of token-based T/V detector compared to the grammar-based one.
@@ -59,6 +140,10 @@ def _extract_sentences_en_ru_from_deixis_files(path_to_files: str, ru_filename:
     Link to the source:
     https://github.com/lena-voita/good-translation-wrong-in-context/tree/master/consistency_testsets/scoring_data
 
+    Deduplication relies on a Bloom filter, so memory stays flat no matter how
+    large the corpus grows, at the price of a negligible chance of dropping
+    a unique sentence pair.
+
     Parameters
     ----------
     path_to_files: str
@@ -73,23 +158,32 @@ def _extract_sentences_en_ru_from_deixis_files(path_to_files: str, ru_filename:
     Tuple[List[str], List[str]]
         Tuple of parallel English and Russian sentences.
     """
-    ru_set = set()
+    ru_seen = _BloomFilter()
     ru_sentences = []
     en_sentences = []
     with open(os.path.join(path_to_files, ru_filename)) as ru_file, \
             open(os.path.join(path_to_files, en_filename)) as en_file:
 
-        for (ru_line, en_line) in zip(ru_file, en_file):
-            ru_sentences_in_line = ru_line.strip().split(DEIXIS_EOS_SEPARATOR)
-            en_sentences_in_line = en_line.strip().split(DEIXIS_EOS_SEPARATOR)
-            assert len(ru_sentences_in_line) == len(en_sentences_in_line)
-            for ru_sentence, en_sentence in zip(ru_sentences_in_line, en_sentences_in_line):
-                # duplicate translation
-                if ru_sentence in ru_set:
-                    continue
-                ru_sentences.append(ru_sentence.strip())
-                en_sentences.append(en_sentence.strip())
-                ru_set.add(ru_sentence)
+        # one C-level split over the whole buffer replaces the per-line
+        # strip+split chain and its intermediate string churn;
+        # files are parallel, so sentences line up by position after the split
+        ru_split_sentences = _DEIXIS_SENTENCE_SEPARATOR_PATTERN.split(ru_file.read())
+        en_split_sentences = _DEIXIS_SENTENCE_SEPARATOR_PATTERN.split(en_file.read())
+
+    assert len(ru_split_sentences) == len(en_split_sentences)
+
+    # the trailing newline of each file yields one empty piece at the end
+    if ru_split_sentences and not ru_split_sentences[-1]:
+        ru_split_sentences.pop()
+        en_split_sentences.pop()
+
+    for ru_sentence, en_sentence in zip(ru_split_sentences, en_split_sentences):
+        # duplicate translation
+        if ru_sentence in ru_seen:
+            continue
+        ru_sentences.append(ru_sentence.strip())
+        en_sentences.append(en_sentence.strip())
+        ru_seen.add(ru_sentence)
 
     assert len(en_sentences) == len(ru_sentences)
 
@@ -168,9 +262,17 @@ def report_metrics(translation_filename: str, reference_filename: str) -> None:
                                 f"Please, run `code/notebooks/parse_file_to_conll.ipynb` first.")
 
     print(f"Reporting metrics for the '{translation_filename}' ...")
-    report_tv_in_file(translation_conll_filename)
-    bleu_score = get_bleu(translation_filename, reference_filename)
-    bleurt_score = get_bleurt_score_for_corpus(translation_bleurt_filename)
+    # BLEU and BLEURT are file-bound, so their reads run in background threads
+    # while the compute-heavy T/V pass occupies the main thread,
+    # overlapping disk I/O with detection instead of doing everything serially
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        bleu_future = executor.submit(get_bleu, translation_filename, reference_filename)
+        bleurt_future = executor.submit(get_bleurt_score_for_corpus, translation_bleurt_filename)
+
+        report_tv_in_file(translation_conll_filename)
+
+        bleu_score = bleu_future.result()
+        bleurt_score = bleurt_future.result()
 
     print('BLEU score: ', bleu_score)
     print('BLEURT score: ', bleurt_score)
@@ -207,8 +309,9 @@ def get_bleu(translation_filename: str, reference_filename: str) -> float:
     """
     with open(translation_filename, 'r', encoding="utf-8") as prediction_f, \
             open(reference_filename, 'r', encoding="utf-8") as reference_f:
-        real = reference_f.readlines()
-        prediction = prediction_f.readlines()
+        # one read+split per file instead of a list of newline-terminated strings
+        real = reference_f.read().splitlines()
+        prediction = prediction_f.read().splitlines()
 
     return corpus_bleu(prediction, [real]).score
 
@@ -227,9 +330,10 @@ def get_bleurt_score_for_corpus(bleurt_filename: str) -> float:
         Mean of all sentence-level BLEURT scores multiplied by 100.
     """
 
-    with open(bleurt_filename) as input_f:
-        scores = list(map(float, input_f.read().splitlines()))
-        return 100 * (sum(scores) / len(scores))
+    # NumPy parses the file straight into a contiguous float array and averages
+    # it in C, instead of materializing a list of lines plus a list of floats
+    scores = np.loadtxt(bleurt_filename, dtype=np.float64, ndmin=1)
+    return float(100 * scores.mean())
 
 
 def create_tv_subcorpus(source_ru_filepath: str, source_en_filepath: str,
@@ -248,10 +352,6 @@ def create_tv_subcorpus(source_ru_filepath: str, source_en_filepath: str,
         Path to the file with resulting English sentences.
     """
 
-    ru_sentences = []
-    en_sentences = []
-    n_sentences_num = v_sentences_num = t_sentences_num = 0
-
     # limits are empirical, they are set to create a kind of balanced dataset
     V_LIMIT = 22000
     N_LIMIT = 100000
@@ -262,23 +362,28 @@ def create_tv_subcorpus(source_ru_filepath: str, source_en_filepath: str,
     with open(source_en_filepath, 'r', encoding='utf-8') as ru_file, \
             open(source_en_filepath, 'r', encoding='utf-8') as en_file:
 
-        for (t_found, v_found), (ru_line, en_line) in zip(t_v_found, zip(ru_file, en_file)):
-
-            if not t_found and len(ru_line) > 100:
-                continue
+        ru_lines = ru_file.readlines()
+        en_lines = en_file.readlines()
 
-            n_found = (not t_found and not v_found)
+    # the keep-mask is computed vectorially over the whole corpus instead of
+    # accumulating counters line by line in Python
+    lines_num = min(len(t_v_found), len(ru_lines), len(en_lines))
+    t_arr = np.fromiter((t_found for t_found, _ in t_v_found), dtype=bool, count=len(t_v_found))[:lines_num]
+    v_arr = np.fromiter((v_found for _, v_found in t_v_found), dtype=bool, count=len(t_v_found))[:lines_num]
+    len_arr = np.fromiter(map(len, ru_lines), dtype=np.int64, count=len(ru_lines))[:lines_num]
 
-            n_sentences_num += n_found
-            v_sentences_num += v_found
-            t_sentences_num += t_found
+    # long sentences are only considered when T was found
+    considered = t_arr | (len_arr <= 100)
+    v_considered = v_arr & considered
+    n_considered = ~t_arr & ~v_arr & considered
 
-            if (v_found and v_sentences_num > V_LIMIT) \
-                    or (n_found and n_sentences_num > N_LIMIT):
-                continue
+    # running counts decide which V/neutral sentences still fit under the limits
+    keep = considered \
+        & ~(v_considered & (np.cumsum(v_considered) > V_LIMIT)) \
+        & ~(n_considered & (np.cumsum(n_considered) > N_LIMIT))
 
-            ru_sentences.append(ru_line)
-            en_sentences.append(en_line)
+    ru_sentences = [line for line, keep_line in zip(ru_lines, keep) if keep_line]
+    en_sentences = [line for line, keep_line in zip(en_lines, keep) if keep_line]
 
     with open(target_ru_filepath, 'w', encoding='utf-8') as ru_file, \
             open(target_en_filepath, 'w', encoding='utf-8') as en_file:
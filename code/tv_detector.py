@@ -1,11 +1,38 @@
+import mmap
+import re
 from abc import ABC, abstractmethod
-from typing import Tuple, Set, List, Optional
+from multiprocessing import Pool
+from typing import Tuple, Set, FrozenSet, List, Optional
 
 from tqdm import tqdm
 
 SPECIAL_T_TOKEN = '<T>'
 SPECIAL_V_TOKEN = '<V>'
 
+# sentences dispatched to a worker process at once, amortizes IPC overhead
+POOL_CHUNKSIZE = 256
+
+# bit lanes for accumulating T/V hits of a sentence in a single integer mask
+T_MASK = 1
+V_MASK = 2
+
+# Russian T/V specific words collected manually by the author, with capitalized
+# variants spelled out; kept as module-level frozenset literals so they are
+# allocated once at import instead of being rebuilt per detector instance
+RUSSIAN_T_WORDS = frozenset({
+    'твоeм', 'твое', 'твоего', 'твоей', 'твоему', 'твоею', 'твои', 'твоим', 'твоими', 'твоих',
+    'твой', 'твою', 'твоя', 'твоё', 'твоём', 'тебе', 'тебя', 'тобой', 'тобою', 'ты',
+    'Твоeм', 'Твое', 'Твоего', 'Твоей', 'Твоему', 'Твоею', 'Твои', 'Твоим', 'Твоими', 'Твоих',
+    'Твой', 'Твою', 'Твоя', 'Твоё', 'Твоём', 'Тебе', 'Тебя', 'Тобой', 'Тобою', 'Ты',
+})
+
+RUSSIAN_V_WORDS = frozenset({
+    'вам', 'вами', 'вас', 'ваш', 'ваша', 'ваше', 'вашего', 'вашей', 'вашем', 'вашему', 'вашею',
+    'ваши', 'вашим', 'вашими', 'ваших', 'вашу', 'вы',
+    'Вам', 'Вами', 'Вас', 'Ваш', 'Ваша', 'Ваше', 'Вашего', 'Вашей', 'Вашем', 'Вашему', 'Вашею',
+    'Ваши', 'Вашим', 'Вашими', 'Ваших', 'Вашу', 'Вы',
+})
+
 
 class TVDetector(ABC):
     """
@@ -27,6 +54,7 @@ class TVDetector(ABC):
     @abstractmethod
     def detect_t_v_labels(
             self, lines: Optional[List[str]] = None, filename: Optional[str] = None,
+            n_processes: Optional[int] = None,
     ) -> List[Tuple[bool, bool]]:
         """ Detects T/V labels Accepts either list of strings or path to source file to perform T/V detection.
 
@@ -36,6 +64,9 @@ class TVDetector(ABC):
             Sentences to label with T/V.
         filename: str, optional
             Name of file, which holds sentences to label with T/V.
+        n_processes: int, optional
+            Number of worker processes to detect with. Detection runs
+            in the current process if not provided.
 
         Returns
         -------
@@ -46,6 +77,26 @@ class TVDetector(ABC):
 
         pass
 
+    @staticmethod
+    def _report_t_v_counts(t_v_list: List[Tuple[bool, bool]]) -> None:
+        """Prints numbers of neutral/T/V sentences found.
+
+        Both counters are accumulated in a single pass over the label list.
+
+        Parameters
+        ----------
+        t_v_list: List[Tuple[bool, bool]]
+            Detected (t_label, v_label) tuples.
+        """
+        t_sentences_num = v_sentences_num = 0
+        for t_item, v_item in t_v_list:
+            t_sentences_num += t_item
+            v_sentences_num += v_item
+
+        print(f'Neutral sentences: {len(t_v_list) - v_sentences_num - t_sentences_num}. '
+              f'V sentences found: {v_sentences_num}. '
+              f'T sentences found: {t_sentences_num}.')
+
     def mark_tv_sentences(self, source_filename: str, target_filename: str) -> str:
         """Prepends T/V labels to source sentences based on information from target file.
 
@@ -88,18 +139,180 @@ class TVDetector(ABC):
 class SimpleTVDetector(TVDetector):
     """Implementation of T/V Detector using simple token-based matching approach."""
 
+    russian_T_words = RUSSIAN_T_WORDS
+    russian_V_words = RUSSIAN_V_WORDS
+
+    # compiled artifacts are shared by all instances, built lazily on first construction
+    _compiled_t_v_pattern: Optional['re.Pattern'] = None
+    _compiled_t_v_bytes_pattern: Optional['re.Pattern'] = None
+    _compiled_scan_line = None
+
     def __init__(self):
-        """Initialises SimpleTVDetector object."""
-        t_words, v_words = self._get_russian_T_V_words()
-        self.russian_T_words = t_words
-        self.russian_V_words = v_words
+        """Initialises SimpleTVDetector object, reusing the class-level compiled artifacts."""
+        self._ensure_patterns_compiled()
+        self.t_v_pattern = SimpleTVDetector._compiled_t_v_pattern
+        self.t_v_bytes_pattern = SimpleTVDetector._compiled_t_v_bytes_pattern
+        self._scan_line = SimpleTVDetector._compiled_scan_line
+
+    @classmethod
+    def _ensure_patterns_compiled(cls) -> None:
+        """Compiles the shared T/V matching artifacts once per class (and per process)."""
+        if cls._compiled_t_v_pattern is not None:
+            return
+
+        cls._compiled_t_v_pattern = cls._compile_t_v_pattern(RUSSIAN_T_WORDS, RUSSIAN_V_WORDS)
+        # bytes twin of the pattern with an extra newline group, used to scan
+        # memory-mapped files without decoding them into per-line str objects;
+        # UTF-8 Cyrillic never contains ASCII whitespace bytes, so the
+        # whitespace lookarounds keep their token semantics at byte level
+        cls._compiled_t_v_bytes_pattern = re.compile(
+            br'(?P<nl>\n)|' + cls._compiled_t_v_pattern.pattern.encode('utf-8'),
+        )
+        cls._compiled_scan_line = cls._generate_line_scanner(cls._compiled_t_v_pattern)
+
+    def __getstate__(self):
+        """Drops the generated scanner before pickling, it cannot be serialized by reference."""
+        state = self.__dict__.copy()
+        del state['_scan_line']
+        return state
+
+    def __setstate__(self, state):
+        """Restores state and regenerates the line scanner, e.g. in a worker process."""
+        self.__dict__.update(state)
+        self._ensure_patterns_compiled()
+        self._scan_line = SimpleTVDetector._compiled_scan_line
+
+    @classmethod
+    def _generate_line_scanner(cls, t_v_pattern: 're.Pattern'):
+        """Generates a line-scanning function specialized to the compiled T/V pattern.
+
+        The vocabularies are fixed once the detector is constructed, so the hot
+        per-line loop is emitted as straight-line source with the pattern's
+        finditer and the masks pre-bound in its global namespace: no attribute
+        or constant lookups are left inside the loop.
+
+        Parameters
+        ----------
+        t_v_pattern: re.Pattern
+            Combined T/V pattern to specialize the scanner to.
+
+        Returns
+        -------
+        Callable[[str], int]
+            Function returning the accumulated T/V bitmask of a line.
+        """
+        scanner_source = (
+            "def scan_line(line):\n"
+            "    t_v_mask = 0\n"
+            "    for match in finditer(line):\n"
+            "        t_v_mask |= T_MASK if match.lastgroup == 't' else V_MASK\n"
+            "        if t_v_mask == BOTH_MASKS:\n"
+            "            break\n"
+            "    return t_v_mask\n"
+        )
+        namespace = {
+            'finditer': t_v_pattern.finditer,
+            'T_MASK': T_MASK, 'V_MASK': V_MASK, 'BOTH_MASKS': T_MASK | V_MASK,
+        }
+        exec(scanner_source, namespace)
+
+        return namespace['scan_line']
+
+    @classmethod
+    def _compile_t_v_pattern(cls, t_words: Set[str], v_words: Set[str]) -> 're.Pattern':
+        """Compiles both word sets into one pattern with a named group per set.
+
+        Boundaries are whitespace lookarounds rather than ``\\b``, so a pattern hit
+        is exactly equivalent to membership of a whitespace-delimited token in the
+        corresponding word set. Each alternation is factored into a prefix trie,
+        so the engine walks shared prefixes ('тво', 'ваш', ...) once instead of
+        backtracking through every alternative, which keeps the scan close to
+        a DFA traversal.
+
+        Parameters
+        ----------
+        t_words: Set[str]
+            T-specific words to compile into the pattern.
+        v_words: Set[str]
+            V-specific words to compile into the pattern.
+
+        Returns
+        -------
+        re.Pattern
+            Compiled pattern matching any word of either set as a whole token,
+            with group 't' or 'v' reporting which set was hit.
+        """
+        return re.compile(
+            r'(?<!\S)(?:(?P<t>' + cls._words_to_trie_pattern(t_words) + r')'
+            r'|(?P<v>' + cls._words_to_trie_pattern(v_words) + r'))(?!\S)'
+        )
+
+    @classmethod
+    def _words_to_trie_pattern(cls, words: Set[str]) -> str:
+        """Builds a prefix-trie regex pattern matching any word from the set.
+
+        Parameters
+        ----------
+        words: Set[str]
+            Words to compile into the pattern.
+
+        Returns
+        -------
+        str
+            Regex pattern string with shared prefixes factored out,
+            e.g. {'вы', 'вас', 'вам'} -> 'в(?:а(?:м|с)|ы)'.
+        """
+        trie = {}
+        for word in words:
+            node = trie
+            for char in word:
+                node = node.setdefault(char, {})
+            node[''] = {}
+
+        return cls._trie_node_to_pattern(trie)
+
+    @classmethod
+    def _trie_node_to_pattern(cls, node: dict) -> str:
+        """Recursively serializes a trie node into a regex pattern fragment.
+
+        An empty-string key marks the end of a word, which makes the rest
+        of the branch optional in the resulting pattern.
+
+        Parameters
+        ----------
+        node: dict
+            Trie node mapping next characters to child nodes.
+
+        Returns
+        -------
+        str
+            Regex pattern fragment matching every word stored under this node.
+        """
+        word_ends_here = '' in node
+        alternatives = [
+            re.escape(char) + cls._trie_node_to_pattern(child)
+            for char, child in sorted(node.items()) if char
+        ]
+
+        if not alternatives:
+            return ''
+
+        if len(alternatives) == 1:
+            pattern = alternatives[0]
+            return '(?:' + pattern + ')?' if word_ends_here else pattern
+
+        pattern = '(?:' + '|'.join(alternatives) + ')'
+        return pattern + '?' if word_ends_here else pattern
 
     def detect_t_v_labels(
             self, lines: Optional[List[str]] = None, filename: Optional[str] = None,
+            n_processes: Optional[int] = None,
     ) -> List[Tuple[bool, bool]]:
         """Detects T/V labels using token-based word matching.
 
         Accepts either list of strings or path to source file to perform T/V detection.
+        Sentences are independent, so detection optionally fans out to a pool
+        of worker processes with order of results preserved.
 
         Parameters
         ----------
@@ -107,6 +320,9 @@ class SimpleTVDetector(TVDetector):
             Sentences to label with T/V.
         filename: str, optional
             Name of file, which holds sentences to label with T/V.
+        n_processes: int, optional
+            Number of worker processes to detect with. Detection runs
+            in the current process if not provided.
 
         Returns
         -------
@@ -124,57 +340,91 @@ class SimpleTVDetector(TVDetector):
             raise RuntimeError('Error occured on T/V labels detection. '
                                'Either source file or list of sentences have to be provided.')
 
-        t_v_list = []
-
-        if filename:
-            data_file = open(filename, "r", encoding="utf-8")
-            lines = data_file.read().splitlines()
+        if filename and not n_processes:
+            t_v_list = self._detect_t_v_in_file(filename)
+        else:
+            if filename:
+                with open(filename, "r", encoding="utf-8") as data_file:
+                    lines = data_file.read().splitlines()
 
-        for line in lines:
-            t_v_list.append(self._token_based_t_v_labels_detection(line))
+            if n_processes:
+                with Pool(n_processes) as pool:
+                    t_v_list = list(pool.imap(
+                        self._token_based_t_v_labels_detection, lines, chunksize=POOL_CHUNKSIZE,
+                    ))
+            else:
+                t_v_list = [self._token_based_t_v_labels_detection(line) for line in lines]
 
-        t_sentences_num = sum(t_item for t_item, v_item in t_v_list)
-        v_sentences_num = sum(v_item for t_item, v_item in t_v_list)
-        print(f'Neutral sentences: {len(t_v_list) - v_sentences_num - t_sentences_num}. '
-              f'V sentences found: {v_sentences_num}. '
-              f'T sentences found: {t_sentences_num}.')
+        self._report_t_v_counts(t_v_list)
 
         return t_v_list
 
     @classmethod
-    def _get_russian_T_V_words(cls) -> Tuple[Set[str], Set[str]]:
+    def _get_russian_T_V_words(cls) -> Tuple[FrozenSet[str], FrozenSet[str]]:
         """Returns tuple of Russian T/V specific words, which were collected manually by the author.
 
         Returns
         -------
-        Tuple[Set[str], Set[str]]
+        Tuple[FrozenSet[str], FrozenSet[str]]
             tuple of T-specific and V-specific Russian words.
         """
 
-        russian_T_tokens = {
-            'ты', 'тебя', 'тебе', 'тобою', 'тобой',
-            'твой', 'твоего', 'твоему', 'твоим', 'твоём', 'твоeм',
-            'твоё', 'твое',
-            'твоя', 'твоей', 'твою', 'твоею', 'твоей',
-            'твои', 'твоих', 'твоим', 'твоими',
-        }
-        russian_T_tokens.update({token[0].upper() + token[1:] for token in russian_T_tokens})
-
-        russian_V_tokens = {
-            'вы', 'вас', 'вам', 'вами',
-            'ваш', 'вашего', 'вашему', 'вашего', 'вашим', 'вашем',
-            'ваше',
-            'ваша', 'вашей', 'вашу', 'вашею',
-            'ваши', 'ваших', 'вашими', 'ваших',
-        }
-        russian_V_tokens.update({token[0].upper() + token[1:] for token in russian_V_tokens})
+        return RUSSIAN_T_WORDS, RUSSIAN_V_WORDS
+
+    def _detect_t_v_in_file(self, filename: str) -> List[Tuple[bool, bool]]:
+        """Performs token-based T/V detection over a memory-mapped file.
 
-        return russian_T_tokens, russian_V_tokens
+        The file is scanned at byte level with the combined bytes pattern in one
+        C-level pass, accumulating a T/V mask per newline-delimited region, so no
+        per-line str objects are materialized and memory footprint stays flat
+        regardless of the file size.
+
+        Parameters
+        ----------
+        filename: str
+            Name of file, which holds sentences to label with T/V.
+
+        Returns
+        -------
+        List[Tuple[bool, bool]]
+            tuples of the (bool, bool) format with meaning (t_label, v_label)
+            for the corresponding lines of the file.
+        """
+        with open(filename, 'rb') as data_file:
+            try:
+                buffer = mmap.mmap(data_file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # empty file cannot be mapped and holds no sentences anyway
+                return []
+
+            with buffer:
+                t_v_list = []
+                t_v_mask = 0
+                for match in self.t_v_bytes_pattern.finditer(buffer):
+                    matched_group = match.lastgroup
+                    if matched_group == 'nl':
+                        t_v_list.append((t_v_mask == T_MASK, t_v_mask == V_MASK))
+                        t_v_mask = 0
+                    elif matched_group == 't':
+                        t_v_mask |= T_MASK
+                    else:
+                        t_v_mask |= V_MASK
+
+                # a trailing line without newline still counts as a sentence
+                if buffer[-1:] != b'\n':
+                    t_v_list.append((t_v_mask == T_MASK, t_v_mask == V_MASK))
+
+        return t_v_list
 
     def _token_based_t_v_labels_detection(self, line: str) -> Tuple[bool, bool]:
         """Performs token-based T/V detection.
 
-        Splits provided line by space and doing lookup of T/V-specific tokens.
+        Scans provided line once with the generated scanner specialized to the
+        combined precompiled pattern of T/V-specific tokens (see
+        _generate_line_scanner), OR-accumulating hits of either kind into a
+        single integer mask, so the whole lookup runs as one C-level pass over
+        the raw string without tokenization or per-line set allocation; the
+        scan stops as soon as both kinds were met.
         If both T/V-specific found, then sentences is marked as neutral.
 
         Parameters
@@ -188,9 +438,10 @@ class SimpleTVDetector(TVDetector):
             tuple of the (bool, bool) format with meaning (t_label, v_label).
         """
 
-        tokens = set(line.strip().split())
-        t_token_met = bool(self.russian_T_words & tokens)
-        v_token_met = bool(self.russian_V_words & tokens)
+        t_v_mask = self._scan_line(line)
+
+        t_token_met = bool(t_v_mask & T_MASK)
+        v_token_met = bool(t_v_mask & V_MASK)
 
         t_sentence_found = t_token_met and not v_token_met
         v_sentence_found = v_token_met and not t_token_met